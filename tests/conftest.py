@@ -0,0 +1,76 @@
+import hashlib
+import os
+
+import pytest
+
+from wyag.objects.repository import Repository
+from wyag.utils.objects_utils import write_loose_object
+
+
+class RepoBuilder(object):
+  """
+  Writes loose objects and references straight into a bare-bones .git directory.
+  """
+  def __init__(self, path):
+    self.path = str(path)
+    for directory in (("objects",), ("refs", "heads"), ("refs", "tags")):
+      os.makedirs(os.path.join(self.path, ".git", *directory))
+    with open(os.path.join(self.path, ".git", "HEAD"), "w") as head_file:
+      head_file.write("ref: refs/heads/master\n")
+    self.repo = Repository(self.path, None)
+    self.timestamp = 1700000000
+
+  def store(self, object_type, data):
+    result = object_type.encode() + b" " + str(len(data)).encode() + b"\x00" + data
+    sha = hashlib.sha1(result).hexdigest()
+    write_loose_object(self.repo, sha, result)
+    return sha
+
+  def blob(self, data):
+    return self.store("blob", data)
+
+  def tree(self, entries):
+    """
+    entries maps a name to a blob sha, a (mode, sha) pair or a nested dict for a subtree.
+    """
+    nodes = []
+    for name, entry in entries.items():
+      if isinstance(entry, dict):
+        mode, sha = b"40000", self.tree(entry)
+      elif isinstance(entry, tuple):
+        mode, sha = entry
+      else:
+        mode, sha = b"100644", entry
+      # Git sorts subtrees as if their names ended with "/".
+      sort_key = name + b"/" if mode == b"40000" else name
+      nodes.append((sort_key, mode + b" " + name + b"\x00" + bytes.fromhex(sha)))
+    return self.store("tree", b"".join(node for _, node in sorted(nodes)))
+
+  def commit(self, tree, parents=(), message=b"commit"):
+    self.timestamp += 1
+    lines = [b"tree " + tree.encode()]
+    lines += [b"parent " + parent.encode() for parent in parents]
+    signature = "wyag <wyag@example.com> {} +0000".format(self.timestamp).encode()
+    lines += [b"author " + signature, b"committer " + signature, b"", message]
+    return self.store("commit", b"\n".join(lines) + b"\n")
+
+  def tag(self, target, object_type, name):
+    lines = [b"object " + target.encode(), b"type " + object_type.encode(), b"tag " + name.encode(),
+             b"tagger wyag <wyag@example.com> 1700000000 +0000", b"", b"tag"]
+    return self.store("tag", b"\n".join(lines) + b"\n")
+
+  def ref(self, name, sha):
+    ref_path = os.path.join(self.path, ".git", *name.split("/"))
+    os.makedirs(os.path.dirname(ref_path), exist_ok=True)
+    with open(ref_path, "w") as ref_file:
+      ref_file.write(sha + "\n")
+
+  def object_files(self):
+    objects_directory = os.path.join(self.path, ".git", "objects")
+    return sorted(os.path.relpath(os.path.join(directory, file), objects_directory)
+                  for directory, _, files in os.walk(objects_directory) for file in files)
+
+
+@pytest.fixture
+def builder(tmp_path):
+  return RepoBuilder(tmp_path)
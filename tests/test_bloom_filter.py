@@ -0,0 +1,38 @@
+from wyag.objects.bloom_filter import BloomFilter
+
+
+def test_contains_added_paths():
+  bloom_filter = BloomFilter.from_paths([b"src/main.py", b"README.md"])
+  assert bloom_filter.maybe_contains(b"src/main.py")
+  assert bloom_filter.maybe_contains(b"README.md")
+
+def test_contains_leading_directories():
+  bloom_filter = BloomFilter.from_paths([b"a/b/c/file.txt"])
+  for path in (b"a", b"a/b", b"a/b/c", b"a/b/c/file.txt"):
+    assert bloom_filter.maybe_contains(path)
+
+def test_rejects_most_absent_paths():
+  paths = [("dir{}/file{}".format(index % 7, index)).encode() for index in range(100)]
+  bloom_filter = BloomFilter.from_paths(paths)
+  absent = [("other{}/file".format(index)).encode() for index in range(1000)]
+  false_positives = sum(bloom_filter.maybe_contains(path) for path in absent)
+  # 10 bits per entry with 7 hashes gives under 1% false positives.
+  assert false_positives < 50
+
+def test_empty_change_set_rejects_everything():
+  bloom_filter = BloomFilter.from_paths([])
+  assert len(bloom_filter.data) == 1
+  assert not bloom_filter.maybe_contains(b"anything")
+  assert not bloom_filter.maybe_contains(b"")
+
+def test_too_many_changes_accepts_everything():
+  bloom_filter = BloomFilter.from_paths(None)
+  assert bloom_filter.data == bytearray(b"\xff")
+  assert bloom_filter.maybe_contains(b"anything")
+  assert bloom_filter.maybe_contains(b"a/b/c")
+
+def test_round_trips_through_bytes():
+  bloom_filter = BloomFilter.from_paths([b"a/b"])
+  copy = BloomFilter(bytes(bloom_filter.data))
+  assert copy.maybe_contains(b"a/b")
+  assert copy.maybe_contains(b"a")
@@ -0,0 +1,36 @@
+from click.testing import CliRunner
+import pytest
+
+from wyag.wyag_lib import cli
+
+
+@pytest.fixture
+def repo_dir(builder, monkeypatch):
+  tree_sha = builder.tree({
+    b"a.txt": builder.blob(b"one\nhello world\n"),
+    b"bin.dat": builder.blob(b"hello\x00binary"),
+    b"src": {b"b.py": builder.blob(b"hello\n")}
+  })
+  builder.ref("refs/heads/master", builder.commit(tree_sha))
+  monkeypatch.chdir(builder.path)
+  return builder.path
+
+def invoke(*args):
+  result = CliRunner().invoke(cli, list(args))
+  assert result.exception is None, result.output
+  return result.output.splitlines()
+
+def test_grep_prints_line_and_binary_matches(repo_dir):
+  assert invoke("grep", "-n", "hello") == [
+    "HEAD:a.txt:2:hello world",
+    "Binary file HEAD:bin.dat matches",
+    "HEAD:src/b.py:1:hello"
+  ]
+
+def test_grep_limits_to_paths_after_separator(repo_dir):
+  assert invoke("grep", "hello", "master", "--", "src") == ["master:src/b.py:hello"]
+  assert invoke("grep", "hello", "--", "src") == ["HEAD:src/b.py:hello"]
+  assert invoke("grep", "--", "hello", "src") == ["HEAD:src/b.py:hello"]
+
+def test_grep_reports_unknown_revision(repo_dir):
+  assert invoke("--verbose", "grep", "hello", "nosuch")[-1] == "Unknown revision or path not in the tree: nosuch"
@@ -0,0 +1,80 @@
+import re
+
+import pytest
+
+from wyag.utils.objects_utils import BINARY_MATCH, BINARY_PROBE_SIZE, ReferenceError, grep_blob, \
+  grep_lines, grep_tree, split_revision_and_paths, walk_tree
+
+
+@pytest.fixture
+def tree(builder):
+  tree_sha = builder.tree({
+    b"README": builder.blob(b"hello readme\n"),
+    b"bin.dat": builder.blob(b"hello\x00binary"),
+    b"src": {
+      b"main.py": builder.blob(b"import os\nprint('hello')\n\nhello()\n"),
+      b"lib": {b"util.py": builder.blob(b"def hello():\n  pass\n")}
+    },
+    b"docs": {b"guide.md": builder.blob(b"no greeting\n")},
+    b"vendor": (b"160000", "a" * 40)
+  })
+  builder.ref("refs/heads/master", builder.commit(tree_sha))
+  return tree_sha
+
+def grep(builder, tree_sha, pattern, **kwargs):
+  return list(grep_tree(builder.repo, tree_sha, re.compile(pattern, re.MULTILINE), jobs=2, **kwargs))
+
+def test_grep_lines_numbers_every_matching_line_once():
+  data = b"hello hello\nnothing\nsay hello\n\nhello"
+  assert grep_lines(data, re.compile(b"hello")) == [(1, b"hello hello"), (3, b"say hello"), (5, b"hello")]
+
+def test_walk_tree_yields_blobs_in_path_order_and_skips_submodules(builder, tree):
+  paths = [path for path, _ in walk_tree(builder.repo, tree)]
+  assert paths == [b"README", b"bin.dat", b"docs/guide.md", b"src/lib/util.py", b"src/main.py"]
+
+def test_walk_tree_prunes_by_directory_and_glob(builder, tree):
+  assert [path for path, _ in walk_tree(builder.repo, tree, pathspecs=(b"src/lib",))] == [b"src/lib/util.py"]
+  assert [path for path, _ in walk_tree(builder.repo, tree, pathspecs=(b"src/*.py",))] == \
+    [b"src/lib/util.py", b"src/main.py"]
+  assert [path for path, _ in walk_tree(builder.repo, tree, pathspecs=(b"*.md",))] == [b"docs/guide.md"]
+
+def test_grep_tree_streams_matches_in_path_order(builder, tree):
+  results = grep(builder, tree, b"hello")
+  assert results == [
+    (b"README", [(1, b"hello readme")]),
+    (b"bin.dat", BINARY_MATCH),
+    (b"src/lib/util.py", [(1, b"def hello():")]),
+    (b"src/main.py", [(2, b"print('hello')"), (4, b"hello()")])
+  ]
+
+def test_grep_tree_searches_binary_files_as_text(builder, tree):
+  results = grep(builder, tree, b"binary", text=True)
+  assert results == [(b"bin.dat", [(1, b"hello\x00binary")])]
+
+def test_binary_match_in_first_chunk_skips_full_inflate(builder):
+  sha = builder.blob(b"\x00needle" + b"x" * (BINARY_PROBE_SIZE * 4))
+  assert grep_blob(builder.repo, sha, re.compile(b"needle")) is BINARY_MATCH
+  assert builder.repo.object_cache.get(sha) is None
+
+def test_binary_match_past_first_chunk_is_found(builder):
+  sha = builder.blob(b"\x00" + b"x" * (BINARY_PROBE_SIZE * 4) + b"needle")
+  assert grep_blob(builder.repo, sha, re.compile(b"needle")) is BINARY_MATCH
+  assert grep_blob(builder.repo, sha, re.compile(b"absent")) == []
+
+def test_repeated_searches_reuse_cached_blobs(builder, tree):
+  grep(builder, tree, b"hello")
+  main_sha = dict(walk_tree(builder.repo, tree))[b"src/main.py"]
+  assert builder.repo.object_cache.get(main_sha) == ("blob", b"import os\nprint('hello')\n\nhello()\n")
+  assert grep(builder, tree, b"import") == [(b"src/main.py", [(1, b"import os")])]
+
+def test_split_revision_and_paths(builder, tree):
+  repo = builder.repo
+  assert split_revision_and_paths(repo, None, ()) == ("HEAD", ())
+  assert split_revision_and_paths(repo, "master", (b"src",)) == ("master", (b"src",))
+  assert split_revision_and_paths(repo, "src", ()) == ("HEAD", ("src",))
+  assert split_revision_and_paths(repo, "*.md", ()) == ("HEAD", ("*.md",))
+  assert split_revision_and_paths(repo, "deleted", (), explicit_paths=True) == ("HEAD", ("deleted",))
+
+def test_split_revision_and_paths_rejects_unknown_revision(builder, tree):
+  with pytest.raises(ReferenceError):
+    split_revision_and_paths(builder.repo, "nosuch", ())
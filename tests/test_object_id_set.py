@@ -0,0 +1,57 @@
+import hashlib
+
+import pytest
+
+from wyag.objects.object_id_set import ObjectIdSet
+
+
+def object_ids(count, salt=b""):
+  return [hashlib.sha1(salt + str(index).encode()).digest() for index in range(count)]
+
+def test_add_reports_new_keys_only():
+  object_id_set = ObjectIdSet()
+  key, = object_ids(1)
+  assert object_id_set.add(key)
+  assert not object_id_set.add(key)
+  assert key in object_id_set
+  assert len(object_id_set) == 1
+
+def test_grows_and_keeps_every_key():
+  object_id_set = ObjectIdSet(capacity=4)
+  keys = object_ids(5000)
+  assert all(object_id_set.add(key) for key in keys)
+  assert object_id_set.capacity >= 5000 / ObjectIdSet.MAX_LOAD
+  assert len(object_id_set) == len(set(keys))
+  assert all(key in object_id_set for key in keys)
+  assert not any(object_id_set.add(key) for key in keys)
+  assert not any(key in object_id_set for key in object_ids(1000, salt=b"absent"))
+
+def test_duplicate_does_not_grow_a_full_table():
+  object_id_set = ObjectIdSet(capacity=4)
+  keys = object_ids(2)
+  for key in keys:
+    object_id_set.add(key)
+  capacity = object_id_set.capacity
+  assert not object_id_set.add(keys[0])
+  assert object_id_set.capacity == capacity
+
+def test_zero_key_is_tracked_separately():
+  object_id_set = ObjectIdSet()
+  zero_key = bytes(20)
+  assert zero_key not in object_id_set
+  assert object_id_set.add(zero_key)
+  assert not object_id_set.add(zero_key)
+  assert zero_key in object_id_set
+  assert len(object_id_set) == 1
+
+def test_collisions_probe_to_the_next_slot():
+  object_id_set = ObjectIdSet(capacity=16)
+  # Same leading bytes, so every key hashes to the same slot.
+  keys = [bytes(8) + bytes([index + 1]) * 12 for index in range(8)]
+  assert all(object_id_set.add(key) for key in keys)
+  assert all(key in object_id_set for key in keys)
+  assert bytes(8) + b"\xff" * 12 not in object_id_set
+
+def test_rejects_keys_that_are_not_20_bytes():
+  with pytest.raises(ValueError):
+    ObjectIdSet().add(b"\x01" * 19)
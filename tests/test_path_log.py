@@ -0,0 +1,109 @@
+import os
+import stat
+
+import pytest
+
+from wyag.objects.bloom_filter import BloomFilter
+from wyag.utils.objects_utils import changed_paths_file, commit_tree, diff_tree_paths, path_changed, \
+  path_limited_log, read_changed_path_filters, read_object, update_changed_path_filters, \
+  write_changed_path_filters
+
+
+@pytest.fixture
+def history(builder):
+  """
+  one -> two -> three -----> merge -> four -> five
+            \\-> side1 -> side2 -/
+  """
+  blob = {value: builder.blob(value) for value in (b"1", b"2", b"3")}
+  commits = {}
+  commits["one"] = builder.commit(builder.tree({b"src": {b"d": {b"f": blob[b"1"]}}, b"top": blob[b"1"]}))
+  commits["two"] = builder.commit(builder.tree({b"src": {b"d": {b"f": blob[b"1"]}}, b"top": blob[b"2"]}),
+                                  parents=[commits["one"]])
+  commits["side1"] = builder.commit(builder.tree({b"src": {b"d": {b"f": blob[b"2"]}}, b"top": blob[b"2"]}),
+                                    parents=[commits["two"]])
+  commits["side2"] = builder.commit(builder.tree({b"src": {b"d": {b"f": blob[b"2"]}}, b"top": blob[b"2"],
+                                                  b"other": blob[b"1"]}),
+                                    parents=[commits["side1"]])
+  commits["three"] = builder.commit(builder.tree({b"src": {b"d": {b"f": blob[b"1"]}}, b"top": blob[b"3"]}),
+                                    parents=[commits["two"]])
+  commits["merge"] = builder.commit(builder.tree({b"src": {b"d": {b"f": blob[b"2"]}}, b"top": blob[b"3"],
+                                                  b"other": blob[b"1"]}),
+                                    parents=[commits["three"], commits["side2"]])
+  commits["four"] = builder.commit(builder.tree({b"src": {b"d": {b"f": blob[b"3"]}}, b"top": blob[b"3"],
+                                                 b"other": blob[b"1"]}),
+                                   parents=[commits["merge"]])
+  commits["five"] = builder.commit(builder.tree({b"src": {b"d": {b"f": blob[b"3"]}}, b"other": blob[b"1"]}),
+                                   parents=[commits["four"]])
+  builder.ref("refs/heads/master", commits["five"])
+  return commits
+
+EXPECTED = {
+  b"src/d/f": ["four", "side1", "one"],
+  b"src": ["four", "side1", "one"],
+  b"top": ["five", "three", "two", "one"],
+  b"other": ["side2"],
+  b"missing": []
+}
+
+def log(builder, history, path, filters=None):
+  names = {sha: name for name, sha in history.items()}
+  return [names[sha] for sha in path_limited_log(builder.repo, history["five"], [path], filters=filters)]
+
+@pytest.mark.parametrize("path", sorted(EXPECTED))
+def test_path_limited_log_simplifies_history(builder, history, path):
+  assert log(builder, history, path) == EXPECTED[path]
+
+@pytest.mark.parametrize("path", sorted(EXPECTED))
+def test_path_limited_log_is_identical_with_filters(builder, history, path):
+  assert update_changed_path_filters(builder.repo, [history["five"]]) == len(history)
+  filters = read_changed_path_filters(builder.repo)
+  assert len(filters) == len(history)
+  assert log(builder, history, path, filters=filters) == EXPECTED[path]
+
+def test_diff_tree_paths_lists_changed_leaves(builder, history):
+  repo = builder.repo
+  trees = {name: commit_tree(read_object(repo, sha)) for name, sha in history.items()}
+  assert sorted(diff_tree_paths(repo, trees["three"], trees["merge"])) == [b"other", b"src/d/f"]
+  assert sorted(diff_tree_paths(repo, None, trees["one"])) == [b"src/d/f", b"top"]
+  assert list(diff_tree_paths(repo, trees["one"], trees["one"])) == []
+  assert path_changed(repo, trees["two"], trees["side1"], b"src/d/f")
+  assert not path_changed(repo, trees["two"], trees["side1"], b"top")
+  assert path_changed(repo, trees["four"], trees["five"], b"top")
+
+def test_changed_path_filters_round_trip(builder):
+  filters = {
+    "b" * 40: BloomFilter.from_paths([b"a/b"]),
+    "1" * 40: BloomFilter.from_paths([]),
+    "f" * 40: BloomFilter.from_paths(None)
+  }
+  write_changed_path_filters(builder.repo, filters)
+  path = changed_paths_file(builder.repo)
+  assert stat.S_IMODE(os.stat(path).st_mode) == 0o444
+
+  loaded = read_changed_path_filters(builder.repo)
+  assert len(loaded) == 3
+  assert [sha for sha, _ in loaded.items()] == sorted(filters)
+  for sha, bloom_filter in filters.items():
+    assert sha in loaded
+    assert loaded.get(sha).data == bloom_filter.data
+  # Before the first, between two and after the last entry.
+  for missing in ("0" * 40, "c" * 40, "f" * 39 + "e"):
+    assert missing not in loaded
+    assert loaded.get(missing) is None
+    assert loaded.find(bytes.fromhex(missing)) is None
+
+def test_missing_filters_file_filters_nothing(builder):
+  filters = read_changed_path_filters(builder.repo)
+  assert len(filters) == 0
+  assert filters.get("a" * 40) is None
+
+def test_update_keeps_existing_filters(builder, history):
+  assert update_changed_path_filters(builder.repo, [history["two"]]) == 2
+  before = {sha: bytes(bloom_filter.data) for sha, bloom_filter in read_changed_path_filters(builder.repo).items()}
+  assert update_changed_path_filters(builder.repo, [history["five"]]) == len(history) - 2
+  after = read_changed_path_filters(builder.repo)
+  assert len(after) == len(history)
+  for sha, data in before.items():
+    assert bytes(after.get(sha).data) == data
+  assert update_changed_path_filters(builder.repo, [history["five"]]) == 0
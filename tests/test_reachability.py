@@ -0,0 +1,114 @@
+import collections
+import os
+
+import pytest
+
+from wyag.utils.objects_utils import count_repository_objects, iter_commits, iter_reachable_objects, \
+  reference_tips
+
+
+@pytest.fixture
+def objects(builder):
+  """
+  Two branches whose commits share a subtree and a blob, plus an annotated tag.
+  """
+  shared = builder.blob(b"shared")
+  lib = builder.tree({b"shared.txt": shared})
+  names = {"shared": shared, "lib": lib}
+  names["first_tree"] = builder.tree({b"lib": lib, b"a.txt": shared})
+  names["first"] = builder.commit(names["first_tree"])
+  names["other"] = builder.blob(b"other")
+  names["second_tree"] = builder.tree({b"lib": lib, b"b.txt": names["other"],
+                                       b"module": (b"160000", "d" * 40)})
+  names["second"] = builder.commit(names["second_tree"], parents=[names["first"]])
+  names["branch_tree"] = builder.tree({b"lib": lib})
+  names["branch"] = builder.commit(names["branch_tree"], parents=[names["first"]])
+  names["tag"] = builder.tag(names["first"], "commit", "v1")
+  builder.ref("refs/heads/master", names["second"])
+  builder.ref("refs/heads/branch", names["branch"])
+  builder.ref("refs/tags/v1", names["tag"])
+  return names
+
+def reachable(builder, tips, objects=True):
+  return list(iter_reachable_objects(builder.repo, tips, objects=objects))
+
+def test_reference_tips_lists_head_first_without_duplicates(builder, objects):
+  tips = reference_tips(builder.repo)
+  assert tips[0] == objects["second"]
+  assert sorted(tips) == sorted([objects["second"], objects["branch"], objects["tag"]])
+
+def test_reference_tips_skips_unborn_head(builder):
+  assert reference_tips(builder.repo) == []
+
+def test_yields_each_object_once(builder, objects):
+  results = reachable(builder, reference_tips(builder.repo))
+  counts = collections.Counter(sha for sha, _, _ in results)
+  assert max(counts.values()) == 1
+  expected = {name for name in objects}
+  assert {sha for sha in counts} == {objects[name] for name in expected}
+
+def test_overlapping_tips_yield_each_commit_once(builder, objects):
+  tips = [objects["second"], objects["branch"], objects["first"], objects["second"]]
+  commits = [sha for sha, object_type, _ in reachable(builder, tips) if object_type == "commit"]
+  assert sorted(commits) == sorted([objects["second"], objects["branch"], objects["first"]])
+  assert sorted(iter_commits(builder.repo, tips)) == sorted(commits)
+
+def test_commits_come_before_trees_and_blobs(builder, objects):
+  types = [object_type for _, object_type, _ in reachable(builder, reference_tips(builder.repo))]
+  first_tree = types.index("tree")
+  assert set(types[:first_tree]) == {"commit", "tag"}
+  assert set(types[first_tree:]) == {"tree", "blob"}
+
+def test_paths_name_trees_and_blobs(builder, objects):
+  paths = {sha: path for sha, _, path in reachable(builder, [objects["second"]])}
+  assert paths[objects["second"]] is None
+  assert paths[objects["second_tree"]] == b""
+  assert paths[objects["lib"]] == b"lib"
+  assert paths[objects["other"]] == b"b.txt"
+
+def test_submodules_are_skipped(builder, objects):
+  assert "d" * 40 not in {sha for sha, _, _ in reachable(builder, [objects["second"]])}
+
+def test_tags_are_peeled_without_objects(builder, objects):
+  results = reachable(builder, [objects["tag"]], objects=False)
+  assert results == [(objects["first"], "commit", None)]
+
+def test_tags_are_yielded_with_objects(builder, objects):
+  results = reachable(builder, [objects["tag"]])
+  assert results[0] == (objects["tag"], "tag", None)
+  assert (objects["first"], "commit", None) in results
+
+def test_tags_of_blobs_yield_the_blob(builder, objects):
+  tag = builder.tag(objects["other"], "blob", "blob-tag")
+  assert reachable(builder, [tag]) == [(tag, "tag", None), (objects["other"], "blob", b"")]
+  assert reachable(builder, [tag], objects=False) == []
+
+def write_pack(builder, name, shas):
+  pack_directory = os.path.join(builder.path, ".git", "objects", "pack")
+  os.makedirs(pack_directory, exist_ok=True)
+  with open(os.path.join(pack_directory, name + ".pack"), "wb") as pack_file:
+    pack_file.write(b"PACK" + (2).to_bytes(4, "big") + len(shas).to_bytes(4, "big"))
+  keys = sorted(bytes.fromhex(sha) for sha in shas)
+  fanout = b"".join(sum(1 for key in keys if key[0] <= index).to_bytes(4, "big") for index in range(256))
+  with open(os.path.join(pack_directory, name + ".idx"), "wb") as index_file:
+    index_file.write(b"\xfftOc" + (2).to_bytes(4, "big") + fanout + b"".join(keys))
+
+def test_count_objects_counts_loose_objects_and_garbage(builder, objects):
+  loose = len(builder.object_files())
+  objects_directory = os.path.join(builder.path, ".git", "objects")
+  garbage_path = os.path.join(objects_directory, objects["shared"][:2], "tmp_obj_leftover")
+  with open(garbage_path, "wb") as garbage_file:
+    garbage_file.write(b"garbage")
+  write_pack(builder, "pack-1", [objects["shared"], "e" * 40])
+  with open(os.path.join(objects_directory, "pack", "stray.idx"), "wb") as stray_file:
+    stray_file.write(b"stray")
+
+  counts = count_repository_objects(builder.repo)
+  assert counts["count"] == loose
+  assert counts["size"] > 0
+  assert counts["packs"] == 1
+  assert counts["in-pack"] == 2
+  assert counts["size-pack"] > 0
+  assert counts["prune-packable"] == 1
+  assert counts["garbage"] == 2
+  assert counts["size-garbage"] > 0
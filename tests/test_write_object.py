@@ -0,0 +1,66 @@
+import os
+import zlib
+
+import pytest
+
+from wyag.objects.git_object import GitBlob
+from wyag.objects.repository import InvalidConfiguration
+from wyag.utils.objects_utils import ObjectTransaction, write_object, read_object
+
+
+def blob(repo, data):
+  git_blob = GitBlob(repo, data)
+  git_blob.initialize()
+  return git_blob
+
+def object_path(builder, sha):
+  return os.path.join(builder.path, ".git", "objects", sha[:2], sha[2:])
+
+def set_compression(builder, level):
+  with open(os.path.join(builder.path, ".git", "config"), "w") as config_file:
+    config_file.write("[core]\ncompression = {}\n".format(level))
+
+def test_writes_readable_object_without_temp_files(builder):
+  sha = write_object(blob(builder.repo, b"hello\n"))
+  assert sha == "ce013625030ba8dba906f756967f9e9ca394464a"
+  assert read_object(builder.repo, sha).data == b"hello\n"
+  assert builder.object_files() == [os.path.join("ce", sha[2:])]
+
+def test_rewriting_existing_object_is_a_no_op(builder):
+  sha = write_object(blob(builder.repo, b"hello\n"))
+  path = object_path(builder, sha)
+  os.utime(path, (0, 0))
+  assert write_object(blob(builder.repo, b"hello\n")) == sha
+  assert os.stat(path).st_mtime == 0
+  assert builder.object_files() == [os.path.join("ce", sha[2:])]
+
+def test_honors_core_compression(builder):
+  data = b"compressible " * 1000
+  set_compression(builder, 0)
+  sha = write_object(blob(builder.repo, data))
+  with open(object_path(builder, sha), "rb") as object_file:
+    compressed = object_file.read()
+  assert compressed == zlib.compress(b"blob 13000\x00" + data, 0)
+
+@pytest.mark.parametrize("level", ["10", "-2", "fast"])
+def test_rejects_invalid_compression(builder, level):
+  set_compression(builder, level)
+  with pytest.raises(InvalidConfiguration):
+    write_object(blob(builder.repo, b"hello\n"))
+
+def test_transaction_writes_nothing_until_exit(builder):
+  with ObjectTransaction(builder.repo) as transaction:
+    first = write_object(blob(builder.repo, b"one"), transaction=transaction)
+    write_object(blob(builder.repo, b"one"), transaction=transaction)
+    second = write_object(blob(builder.repo, b"two"), transaction=transaction)
+    assert len(transaction.pending) == 2
+    assert not os.path.exists(object_path(builder, first))
+    assert all(os.path.basename(file).startswith("tmp_obj_") for file in builder.object_files())
+  assert builder.object_files() == sorted(os.path.join(sha[:2], sha[2:]) for sha in (first, second))
+
+def test_transaction_exception_leaves_nothing(builder):
+  with pytest.raises(RuntimeError):
+    with ObjectTransaction(builder.repo) as transaction:
+      write_object(blob(builder.repo, b"one"), transaction=transaction)
+      raise RuntimeError("abort")
+  assert builder.object_files() == []
@@ -0,0 +1,56 @@
+import hashlib
+
+
+class BloomFilter(object):
+  """
+  Changed-path Bloom filter for a single commit. A negative answer from
+  maybe_contains is definite, a positive answer may be a false positive.
+  """
+  BITS_PER_ENTRY = 10
+  NUM_HASHES = 7
+  MAX_CHANGED_PATHS = 512
+
+  def __init__(self, data):
+    self.data = bytearray(data)
+    self.num_bits = len(self.data) * 8
+
+  @classmethod
+  def from_paths(cls, paths):
+    """
+    Builds a filter holding every path and all of its leading directories.
+    Passing None marks the commit as having too many changes to filter.
+    """
+    if paths is None:
+      # Every bit set: every query answers maybe.
+      return cls(b"\xff")
+
+    entries = set()
+    for path in paths:
+      entries.add(path)
+      slash_index = path.rfind(b"/")
+      while slash_index > 0:
+        path = path[:slash_index]
+        entries.add(path)
+        slash_index = path.rfind(b"/")
+
+    size = max(1, (len(entries) * cls.BITS_PER_ENTRY + 7) // 8)
+    bloom_filter = cls(bytes(size))
+    for entry in entries:
+      bloom_filter.add(entry)
+    return bloom_filter
+
+  def positions(self, path):
+    digest = hashlib.blake2b(path, digest_size=8).digest()
+    first = int.from_bytes(digest[:4], "big")
+    second = int.from_bytes(digest[4:], "big")
+    return [(first + index * second) % self.num_bits for index in range(self.NUM_HASHES)]
+
+  def add(self, path):
+    for position in self.positions(path):
+      self.data[position >> 3] |= 1 << (position & 7)
+
+  def maybe_contains(self, path):
+    for position in self.positions(path):
+      if not self.data[position >> 3] & (1 << (position & 7)):
+        return False
+    return True
@@ -115,9 +115,8 @@ class TreeParser(object):
     
     # due to inclusive-exclusive, include the last bit
     sha_end = null_index + self.sha_length + 1 
-    sha = hex(int.from_bytes(raw_data[null_index + 1:sha_end], "big"))
-    # hex constructs a string prefixed with 0x, drop that.
-    sha = sha[2:]
+    # bytes.hex keeps leading zeros, unlike hex(int).
+    sha = raw_data[null_index + 1:sha_end].hex()
 
     return sha_end, GitTreeNode(mode, path, sha)
   
@@ -0,0 +1,41 @@
+import collections
+import threading
+
+
+class ObjectCache(object):
+  """
+  Bounded LRU cache of inflated objects keyed by sha.
+  Safe to share between threads.
+  """
+  def __init__(self, max_size=32 * 1024 * 1024):
+    self.max_size = max_size
+    self.size = 0
+    self.entries = collections.OrderedDict()
+    self.lock = threading.Lock()
+
+  def get(self, sha):
+    """
+    Returns the cached (object_type, data) pair for sha or None.
+    """
+    with self.lock:
+      entry = self.entries.get(sha)
+      if entry is not None:
+        self.entries.move_to_end(sha)
+      return entry
+
+  def put(self, sha, object_type, data):
+    """
+    Caches data for sha, evicting the least recently used objects when over max_size.
+    Objects larger than max_size are not cached.
+    """
+    if len(data) > self.max_size:
+      return
+    with self.lock:
+      if sha in self.entries:
+        self.entries.move_to_end(sha)
+        return
+      self.entries[sha] = (object_type, data)
+      self.size += len(data)
+      while self.size > self.max_size:
+        _, (_, evicted_data) = self.entries.popitem(last=False)
+        self.size -= len(evicted_data)
@@ -1,17 +1,26 @@
 import os
 import configparser
+import zlib
+
+from wyag.objects.object_cache import ObjectCache
 
 
 class RepositoryInitializationError(Exception):
   pass
 
 
+class InvalidConfiguration(Exception):
+  pass
+
+
 class Repository(object):
   def __init__(self, path, logger, force=False):
     self.worktree = path
     self.gitdir = os.path.join(path, ".git")
     self.force = force
     self.config = configparser.ConfigParser()
+    self.config_loaded = False
+    self.object_cache = ObjectCache()
     self.logger = logger
 
   def repo_path(self, *path):
@@ -50,6 +59,33 @@ class Repository(object):
     else:
       return None
 
+  def read_config(self):
+    """
+    Loads the Repository's config file once and returns the parsed config.
+    A missing config file leaves the config empty.
+    """
+    if not self.config_loaded:
+      config_file = self.repo_path("config")
+      if os.path.isfile(config_file):
+        self.config.read([config_file])
+      self.config_loaded = True
+    return self.config
+
+  def compression_level(self):
+    """
+    Returns the zlib level for loose objects as configured by core.compression.
+
+    Raises InvalidConfiguration exception if the level is not an integer in [-1, 9].
+    """
+    config = self.read_config()
+    try:
+      level = config.getint("core", "compression", fallback=zlib.Z_DEFAULT_COMPRESSION)
+    except ValueError:
+      raise InvalidConfiguration("Bad core.compression {}".format(config.get("core", "compression")))
+    if level < -1 or level > 9:
+      raise InvalidConfiguration("Bad zlib compression level {}".format(level))
+    return level
+
   def initialize(self):
     self.logger.info("initialize called with: {}".format(vars(self)))
 
@@ -2,9 +2,16 @@ import os
 import zlib
 import hashlib
 import collections
+import concurrent.futures
+import fnmatch
+import heapq
+import itertools
 import re
+import tempfile
 
 from wyag.objects.repository import Repository
+from wyag.objects.bloom_filter import BloomFilter
+from wyag.objects.object_id_set import ObjectIdSet
 from wyag.objects.git_object import GIT_OBJECT_TYPE_TO_CLASS, GIT_OBJECT_TYPES,\
   GitTag
 
@@ -30,41 +37,143 @@ def find_repo(path, logger, required=True):
 class MalformedObject(Exception):
   pass
 
-def read_object(repo, sha):
-  object_path = repo.repo_file("objects", sha[:2], sha[2:])
+def parse_object_header(raw_object_file, object_path):
+  space_index = raw_object_file.find(b" ")
+  if space_index == -1:
+    raise MalformedObject("Missing space separator in {}".format(object_path))
+  object_type = raw_object_file[:space_index]
+
+  null_index = raw_object_file.find(b"\x00")
+  if null_index == -1:
+    raise MalformedObject("Missing null separator in {}".format(object_path))
+  expect_size = int(raw_object_file[space_index + 1:null_index].decode("ascii"))
+  return object_type.decode(), expect_size, null_index
+
+def object_data(raw_object_file, expect_size, null_index, object_path):
+  actual_size = len(raw_object_file) - null_index - 1
+  if expect_size != actual_size:
+    raise MalformedObject("Invalid size: {} != {} in {}".format(expect_size, actual_size, object_path))
+  return raw_object_file[null_index + 1:]
+
+def read_raw_object(repo, sha):
+  cached = repo.object_cache.get(sha)
+  if cached is not None:
+    return cached
 
+  object_path = repo.repo_file("objects", sha[:2], sha[2:])
   with open(object_path, "rb") as object_file:
     raw_object_file = zlib.decompress(object_file.read())
-    space_index = raw_object_file.find(b" ")
-    if space_index == -1:
-      raise MalformedObject("Missing space separator in {}".format(object_path))
-    object_type = raw_object_file[:space_index]
-
-    null_index = raw_object_file.find(b"\x00")
-    expect_size = int(raw_object_file[space_index + 1:null_index].decode("ascii"))
-    actual_size = len(raw_object_file) - null_index - 1
-    if expect_size != actual_size:
-      raise MalformedObject("Invalid size: {} != {}".format(expect_size, actual_size))
-    data = raw_object_file[null_index + 1:]
-
-    git_object = GIT_OBJECT_TYPE_TO_CLASS.get(object_type.decode(), None)
-    if git_object is None:
-      raise MalformedObject("Invalid object_type: {}".format(object_type))
+  object_type, expect_size, null_index = parse_object_header(raw_object_file, object_path)
+  data = object_data(raw_object_file, expect_size, null_index, object_path)
 
-    git_object = git_object(repo, data)
-    git_object.initialize()
-    return git_object
+  repo.object_cache.put(sha, object_type, data)
+  return object_type, data
 
-def write_object(git_object, write=True):
+def read_object(repo, sha):
+  object_type, data = read_raw_object(repo, sha)
+
+  git_object = GIT_OBJECT_TYPE_TO_CLASS.get(object_type, None)
+  if git_object is None:
+    raise MalformedObject("Invalid object_type: {}".format(object_type))
+
+  git_object = git_object(repo, data)
+  git_object.initialize()
+  return git_object
+
+def object_exists(repo, sha):
+  return os.path.isfile(repo.repo_path("objects", sha[:2], sha[2:]))
+
+def fsync_path(path):
+  file_descriptor = os.open(path, os.O_RDONLY)
+  try:
+    os.fsync(file_descriptor)
+  finally:
+    os.close(file_descriptor)
+
+class ObjectTransaction(object):
+  """
+  Batches loose object writes. Objects are staged as temp files and only
+  fsynced, renamed into place and have their directories synced on commit.
+  """
+  def __init__(self, repo):
+    self.repo = repo
+    self.pending = collections.OrderedDict()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    if exc_type is None:
+      self.commit()
+    else:
+      self.rollback()
+    return False
+
+  def __contains__(self, sha):
+    return sha in self.pending
+
+  def stage(self, sha, temp_path):
+    self.pending[sha] = temp_path
+
+  def commit(self):
+    directories = set()
+    try:
+      for temp_path in self.pending.values():
+        fsync_path(temp_path)
+      for sha, temp_path in list(self.pending.items()):
+        object_path = self.repo.repo_path("objects", sha[:2], sha[2:])
+        os.replace(temp_path, object_path)
+        # Renamed objects are in place, so rollback must not touch them.
+        del self.pending[sha]
+        directories.add(os.path.dirname(object_path))
+      if len(directories) > 0:
+        # New fan-out directories are entries of objects/ itself.
+        directories.add(self.repo.repo_path("objects"))
+      for directory in sorted(directories):
+        fsync_path(directory)
+    except BaseException:
+      self.rollback()
+      raise
+
+  def rollback(self):
+    for temp_path in self.pending.values():
+      if os.path.exists(temp_path):
+        os.remove(temp_path)
+    self.pending.clear()
+
+def write_loose_object(repo, sha, result, transaction=None):
+  object_directory = repo.repo_dir("objects", sha[:2], mkdir=True)
+  file_descriptor, temp_path = tempfile.mkstemp(prefix="tmp_obj_", dir=object_directory)
+  try:
+    with os.fdopen(file_descriptor, "wb") as temp_file:
+      temp_file.write(zlib.compress(result, repo.compression_level()))
+      if transaction is None:
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+    # Loose objects are immutable.
+    os.chmod(temp_path, 0o444)
+    if transaction is None:
+      os.replace(temp_path, repo.repo_path("objects", sha[:2], sha[2:]))
+  except BaseException:
+    os.remove(temp_path)
+    raise
+
+  if transaction is not None:
+    transaction.stage(sha, temp_path)
+  else:
+    fsync_path(object_directory)
+
+def write_object(git_object, write=True, transaction=None):
   data = git_object.serialize()
   result = git_object.object_type.encode() + b" " + str(len(data)).encode() + b"\x00" + data
   sha = hashlib.sha1(result).hexdigest()
 
   # NOTE: git_object.repo may be None if poorly initialized.
-  if write and git_object.repo is not None:
-    object_path = git_object.repo.repo_file("objects", sha[:2], sha[2:], mkdir=write)
-    with open(object_path, "wb") as object_file:
-      object_file.write(zlib.compress(result))
+  repo = git_object.repo
+  if write and repo is not None:
+    already_written = transaction is not None and sha in transaction
+    if not already_written and not object_exists(repo, sha):
+      write_loose_object(repo, sha, result, transaction=transaction)
 
   return sha
 
@@ -104,12 +213,14 @@ def find_object(repo, name, object_type=None, follow=True):
     elif not follow:
       return None
     elif git_object.object_type == "tag":
-      sha = git_object.data.get(b"object").decode("ascii")
+      sha = git_object.data.get(b"object")[0].decode("ascii")
     elif git_object.object_type == "commit" and object_type == "tree":
       sha = git_object.data.get(b"tree")[0].decode("ascii")
     else:
       return None
 
+REFERENCE_PREFIXES = ["refs/", "refs/tags/", "refs/heads/", "refs/remotes/"]
+
 def resolve_object(repo, name):
   name = name.strip()
   if len(name) == 0:
@@ -118,6 +229,11 @@ def resolve_object(repo, name):
     return [resolve_reference(repo, "HEAD")]
 
   candidates = []
+  for prefix in REFERENCE_PREFIXES:
+    ref_file = repo.repo_path(prefix + name)
+    if os.path.isfile(ref_file):
+      return [resolve_reference(repo, ref_file)]
+
   hashRE = re.compile(r"^[0-9A-Fa-f]{40}$")
   shortenHashRE = re.compile(r"^[0-9][A-F][a-f]{4,40}$")
   if hashRE.match(name):
@@ -168,7 +284,7 @@ def resolve_reference(repo, ref):
   with open(ref_file) as ref_descriptor:
     data = ref_descriptor.read().rstrip()
     if data.startswith(ref_prefix):
-      return resolve_reference(data[len(ref_prefix):])
+      return resolve_reference(repo, data[len(ref_prefix):])
     else:
       return data
 
@@ -226,3 +342,608 @@ def create_tag_ref(repo, name, sha):
   tag_file = repo.repo_file("refs", "tags", name, mkdir=True)
   with open(tag_file, "w") as tag_file_descriptor:
     tag_file_descriptor.write(sha)
+
+def tree_path_exists(repo, tree_sha, path):
+  sha = tree_sha
+  for component in path.strip(b"/").split(b"/"):
+    if sha is None:
+      return False
+    node = next((node for node in read_object(repo, sha).data if node.path == component), None)
+    if node is None:
+      return False
+    sha = node.sha if node.mode == b"40000" else None
+  return True
+
+def split_revision_and_paths(repo, revision, paths, explicit_paths=False, default="HEAD"):
+  """
+  Click drops "--", so the caller says through explicit_paths whether revision came after it.
+  Otherwise revision is taken as the first path only if it is a glob or exists in default's tree.
+
+  Raises ReferenceError if revision is neither a revision nor a path.
+  """
+  if revision is None:
+    return default, tuple(paths)
+  if explicit_paths:
+    return default, (revision, *paths)
+  if len(resolve_object(repo, revision)) > 0:
+    return revision, tuple(paths)
+
+  tree_sha = find_object(repo, default, object_type="tree")
+  encoded = revision.encode()
+  if PATHSPEC_MAGIC.search(encoded) is not None or tree_path_exists(repo, tree_sha, encoded):
+    return default, (revision, *paths)
+  raise ReferenceError("Unknown revision or path not in the tree: {}".format(revision))
+
+PATHSPEC_MAGIC = re.compile(rb"[*?\[]")
+
+def match_pathspec(path, pathspecs):
+  if len(pathspecs) == 0:
+    return True
+  for pathspec in pathspecs:
+    directory = pathspec.rstrip(b"/")
+    if path == directory or path.startswith(directory + b"/") or fnmatch.fnmatchcase(path, pathspec):
+      return True
+  return False
+
+def pathspec_may_descend(directory, pathspecs):
+  if len(pathspecs) == 0:
+    return True
+  directory_prefix = directory + b"/"
+  for pathspec in pathspecs:
+    magic = PATHSPEC_MAGIC.search(pathspec)
+    literal = pathspec if magic is None else pathspec[:magic.start()]
+    literal_directory = literal.rstrip(b"/")
+    if magic is None and (literal_directory == directory or directory.startswith(literal_directory + b"/")):
+      return True
+    if literal.startswith(directory_prefix) or directory_prefix.startswith(literal):
+      return True
+  return False
+
+def walk_tree(repo, tree_sha, pathspecs=()):
+  """
+  Yields (path, sha) for every blob below tree_sha in path order.
+  Subtrees that cannot match pathspecs are never read.
+  """
+  stack = [(b"40000", b"", tree_sha)]
+  while len(stack) > 0:
+    mode, path, sha = stack.pop()
+    if mode != b"40000":
+      yield path, sha
+      continue
+
+    prefix = path + b"/" if path != b"" else b""
+    git_tree = read_object(repo, sha)
+    # Push in reverse so that entries pop in tree order.
+    for node in reversed(git_tree.data):
+      node_path = prefix + node.path
+      if node.mode == b"40000":
+        if pathspec_may_descend(node_path, pathspecs):
+          stack.append((node.mode, node_path, node.sha))
+      elif node.mode == b"160000":
+        # Submodule commits live in another repository.
+        continue
+      elif match_pathspec(node_path, pathspecs):
+        stack.append((node.mode, node_path, node.sha))
+
+BINARY_PROBE_SIZE = 8000
+
+def is_binary(data):
+  return b"\x00" in data[:BINARY_PROBE_SIZE]
+
+BINARY_MATCH = object()
+
+def grep_lines(data, regex):
+  """
+  Returns a list of (line_number, line) for every line of data matching regex.
+  """
+  matches = []
+  position = 0
+  line_number = 1
+  counted = 0
+  while position < len(data):
+    match = regex.search(data, position)
+    if match is None:
+      break
+    line_start = data.rfind(b"\n", 0, match.start()) + 1
+    line_end = data.find(b"\n", match.start())
+    if line_end == -1:
+      line_end = len(data)
+    line_number += data.count(b"\n", counted, line_start)
+    counted = line_start
+    matches.append((line_number, data[line_start:line_end]))
+    position = line_end + 1
+  return matches
+
+def grep_blob(repo, sha, regex, text=False):
+  """
+  Returns the (line_number, line) matches of a blob, or BINARY_MATCH if
+  the blob is binary, text is False and regex matches anywhere in it.
+  A match in the first inflated chunk of a binary blob skips inflating the rest.
+  """
+  cached = repo.object_cache.get(sha)
+  if cached is not None:
+    _, data = cached
+  else:
+    object_path = repo.repo_file("objects", sha[:2], sha[2:])
+    with open(object_path, "rb") as object_file:
+      compressed = object_file.read()
+    decompressor = zlib.decompressobj()
+    # The header is at most "blob " followed by 20 digits and a null byte.
+    head = decompressor.decompress(compressed, BINARY_PROBE_SIZE + 32)
+    _, expect_size, null_index = parse_object_header(head, object_path)
+    probe = head[null_index + 1:]
+    if not text and is_binary(probe) and regex.search(probe) is not None:
+      return BINARY_MATCH
+
+    raw_object_file = head + decompressor.decompress(decompressor.unconsumed_tail) + decompressor.flush()
+    data = object_data(raw_object_file, expect_size, null_index, object_path)
+    # Repeated searches of the same revision reuse the inflated blob.
+    repo.object_cache.put(sha, "blob", data)
+
+  if not text and is_binary(data):
+    return BINARY_MATCH if regex.search(data) is not None else []
+  return grep_lines(data, regex)
+
+def grep_tree(repo, tree_sha, regex, pathspecs=(), text=False, jobs=None):
+  """
+  Yields (path, matches) for every blob below tree_sha that matches, where
+  matches is either a list of (line_number, line) or BINARY_MATCH.
+  Blobs are scanned on a thread pool while results stream in path order.
+  """
+  if jobs is None:
+    jobs = os.cpu_count() or 1
+  window = jobs * 4
+
+  with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+    pending = collections.deque()
+    for path, sha in walk_tree(repo, tree_sha, pathspecs=pathspecs):
+      pending.append((path, executor.submit(grep_blob, repo, sha, regex, text)))
+      if len(pending) >= window:
+        path, future = pending.popleft()
+        matches = future.result()
+        if matches is BINARY_MATCH or len(matches) > 0:
+          yield path, matches
+    while len(pending) > 0:
+      path, future = pending.popleft()
+      matches = future.result()
+      if matches is BINARY_MATCH or len(matches) > 0:
+        yield path, matches
+
+TREE_MODE = b"40000"
+
+def commit_tree(git_commit):
+  return git_commit.data.get(b"tree")[0].decode("ascii")
+
+def commit_parents(git_commit):
+  return [parent.decode("ascii") for parent in git_commit.data.get(b"parent", [])]
+
+def commit_timestamp(git_commit):
+  # committer is "name <email> timestamp timezone".
+  committer = git_commit.data.get(b"committer", [b"0 +0000"])[0]
+  return int(committer.rsplit(b" ", 2)[-2])
+
+def tree_nodes(repo, tree_sha):
+  if tree_sha is None:
+    return {}
+  return {node.path: node for node in read_object(repo, tree_sha).data}
+
+def diff_tree_paths(repo, old_tree_sha, new_tree_sha, prefix=b""):
+  """
+  Yields the path of every entry that differs between two trees.
+  Either sha may be None for an empty tree. Identical subtrees are never read.
+  """
+  if old_tree_sha == new_tree_sha:
+    return
+  old_nodes = tree_nodes(repo, old_tree_sha)
+  new_nodes = tree_nodes(repo, new_tree_sha)
+  for name in sorted(old_nodes.keys() | new_nodes.keys()):
+    old_node = old_nodes.get(name)
+    new_node = new_nodes.get(name)
+    if old_node is not None and new_node is not None and \
+       (old_node.mode, old_node.sha) == (new_node.mode, new_node.sha):
+      continue
+
+    path = prefix + name
+    old_subtree = old_node.sha if old_node is not None and old_node.mode == TREE_MODE else None
+    new_subtree = new_node.sha if new_node is not None and new_node.mode == TREE_MODE else None
+    # Entries that are not trees on either side changed themselves.
+    if (old_node is not None and old_subtree is None) or (new_node is not None and new_subtree is None):
+      yield path
+    if old_subtree is not None or new_subtree is not None:
+      yield from diff_tree_paths(repo, old_subtree, new_subtree, prefix=path + b"/")
+
+def path_changed(repo, old_tree_sha, new_tree_sha, path):
+  """
+  Returns whether path differs between two trees by comparing the entries along it.
+  Stops descending as soon as both sides name the same subtree.
+  """
+  old_entry = (TREE_MODE, old_tree_sha) if old_tree_sha is not None else (None, None)
+  new_entry = (TREE_MODE, new_tree_sha) if new_tree_sha is not None else (None, None)
+  if path == b"":
+    return old_entry != new_entry
+  for component in path.split(b"/"):
+    if old_entry == new_entry:
+      return False
+    entries = []
+    for mode, sha in (old_entry, new_entry):
+      node = tree_nodes(repo, sha).get(component) if mode == TREE_MODE else None
+      entries.append((node.mode, node.sha) if node is not None else (None, None))
+    old_entry, new_entry = entries
+  return old_entry != new_entry
+
+def reference_tips(repo):
+  """
+  Returns the shas named by HEAD and every reference, HEAD first.
+  An unborn HEAD is skipped.
+  """
+  tips = []
+  try:
+    tips.append(resolve_reference(repo, "HEAD"))
+  except FileNotFoundError:
+    pass
+
+  references = [list_reference(repo)]
+  while len(references) > 0:
+    for reference in references.pop().values():
+      if isinstance(reference, str):
+        tips.append(reference)
+      else:
+        references.append(reference)
+  return list(collections.OrderedDict.fromkeys(tips))
+
+def iter_reachable_objects(repo, tips, objects=True):
+  """
+  Yields (sha, object_type, path) for every object reachable from tips exactly once.
+
+  Commits and tags come first, then the trees and blobs they reference.
+  path is None for commits and tags. If objects is False, only commits are yielded.
+  Visited and pending objects are kept as packed 20-byte ids to bound memory on large repositories.
+  """
+  key_size = ObjectIdSet.KEY_SIZE
+  seen = ObjectIdSet()
+  pending = []
+  for tip in tips:
+    key = bytes.fromhex(tip)
+    if seen.add(key):
+      pending.append(key)
+
+  # Stacks of packed ids, popped from the end.
+  commits = bytearray()
+  root_trees = bytearray()
+  tip_objects = []
+  while len(pending) > 0:
+    key = pending.pop()
+    sha = key.hex()
+    object_type, _ = read_raw_object(repo, sha)
+    if object_type == "commit":
+      commits += key
+    elif object_type == "tag":
+      if objects:
+        yield sha, object_type, None
+      # Tags are peeled even when only commits are listed.
+      target = bytes.fromhex(read_object(repo, sha).data.get(b"object")[0].decode("ascii"))
+      if seen.add(target):
+        pending.append(target)
+    elif objects:
+      tip_objects.append((key, object_type))
+
+  while len(commits) > 0:
+    key = bytes(commits[-key_size:])
+    del commits[-key_size:]
+    sha = key.hex()
+    yield sha, "commit", None
+    git_commit = read_object(repo, sha)
+    for parent in reversed(commit_parents(git_commit)):
+      parent_key = bytes.fromhex(parent)
+      if seen.add(parent_key):
+        commits += parent_key
+    tree_key = bytes.fromhex(commit_tree(git_commit))
+    if objects and seen.add(tree_key):
+      root_trees += tree_key
+
+  if not objects:
+    return
+
+  # Root trees are unpacked one at a time, in the order their commits were visited.
+  roots = itertools.chain(tip_objects, ((bytes(root_trees[offset:offset + key_size]), "tree")
+                                        for offset in range(0, len(root_trees), key_size)))
+  for root_key, root_type in roots:
+    # Only the entries of the trees on the current path are pending here.
+    stack = [(root_key, root_type, b"")]
+    while len(stack) > 0:
+      key, object_type, path = stack.pop()
+      sha = key.hex()
+      yield sha, object_type, path
+      if object_type != "tree":
+        continue
+      prefix = path + b"/" if path != b"" else b""
+      for node in reversed(read_object(repo, sha).data):
+        if node.mode == b"160000":
+          # Submodule commits live in another repository.
+          continue
+        node_key = bytes.fromhex(node.sha)
+        if seen.add(node_key):
+          stack.append((node_key, "tree" if node.mode == TREE_MODE else "blob", prefix + node.path))
+
+def iter_commits(repo, tips):
+  """
+  Yields the sha of every commit reachable from tips exactly once.
+  """
+  for sha, object_type, _ in iter_reachable_objects(repo, tips, objects=False):
+    if object_type == "commit":
+      yield sha
+
+CHANGED_PATHS_SIGNATURE = b"WCPB"
+CHANGED_PATHS_VERSION = 2
+# "WCPB", version, then the number of commits.
+CHANGED_PATHS_HEADER_SIZE = 9
+# Commit id, then the offset and size of its filter.
+CHANGED_PATHS_ENTRY_SIZE = 28
+
+def changed_paths_file(repo, mkdir=False):
+  # Lives beside objects/info/commit-graph, where git keeps its own filters.
+  return repo.repo_file("objects", "info", "changed-paths", mkdir=mkdir)
+
+class ChangedPathFilters(object):
+  """
+  Changed-path filters as stored in objects/info/changed-paths. Commits are
+  found by binary search over a table sorted by id, and a BloomFilter is only
+  built for the commit asked for.
+  """
+  def __init__(self, raw_data=None):
+    self.raw_data = raw_data
+    self.count = 0 if raw_data is None else int.from_bytes(raw_data[5:CHANGED_PATHS_HEADER_SIZE], "big")
+
+  def __len__(self):
+    return self.count
+
+  def __contains__(self, sha):
+    return self.find(bytes.fromhex(sha)) is not None
+
+  def entry(self, index):
+    offset = CHANGED_PATHS_HEADER_SIZE + index * CHANGED_PATHS_ENTRY_SIZE
+    key = self.raw_data[offset:offset + 20]
+    data_offset = int.from_bytes(self.raw_data[offset + 20:offset + 24], "big")
+    size = int.from_bytes(self.raw_data[offset + 24:offset + 28], "big")
+    return key, self.raw_data[data_offset:data_offset + size]
+
+  def find(self, key):
+    low, high = 0, self.count
+    while low < high:
+      middle = (low + high) // 2
+      offset = CHANGED_PATHS_HEADER_SIZE + middle * CHANGED_PATHS_ENTRY_SIZE
+      middle_key = self.raw_data[offset:offset + 20]
+      if middle_key == key:
+        return middle
+      elif middle_key < key:
+        low = middle + 1
+      else:
+        high = middle
+    return None
+
+  def get(self, sha):
+    """
+    Returns the BloomFilter of commit sha, or None if it has none.
+    """
+    index = self.find(bytes.fromhex(sha))
+    if index is None:
+      return None
+    _, data = self.entry(index)
+    return BloomFilter(data)
+
+  def items(self):
+    for index in range(self.count):
+      key, data = self.entry(index)
+      yield key.hex(), BloomFilter(data)
+
+def read_changed_path_filters(repo):
+  """
+  Returns the repository's ChangedPathFilters. Without a filters file every commit is unfiltered.
+  """
+  path = changed_paths_file(repo)
+  if path is None or not os.path.isfile(path):
+    return ChangedPathFilters()
+
+  with open(path, "rb") as filters_file:
+    raw_data = filters_file.read()
+  if raw_data[:4] != CHANGED_PATHS_SIGNATURE or raw_data[4] != CHANGED_PATHS_VERSION:
+    raise MalformedObject("Unsupported changed-path filters in {}".format(path))
+  return ChangedPathFilters(raw_data)
+
+def write_changed_path_filters(repo, filters):
+  """
+  Writes filters, a dict of commit sha to BloomFilter, to objects/info/changed-paths.
+  """
+  path = changed_paths_file(repo, mkdir=True)
+  shas = sorted(filters)
+  table = [CHANGED_PATHS_SIGNATURE, bytes([CHANGED_PATHS_VERSION]), len(shas).to_bytes(4, "big")]
+  blobs = []
+  data_offset = CHANGED_PATHS_HEADER_SIZE + len(shas) * CHANGED_PATHS_ENTRY_SIZE
+  for sha in shas:
+    data = bytes(filters[sha].data)
+    table.append(bytes.fromhex(sha) + data_offset.to_bytes(4, "big") + len(data).to_bytes(4, "big"))
+    blobs.append(data)
+    data_offset += len(data)
+
+  file_descriptor, temp_path = tempfile.mkstemp(prefix="tmp_changed_paths_", dir=os.path.dirname(path))
+  try:
+    with os.fdopen(file_descriptor, "wb") as temp_file:
+      temp_file.write(b"".join(table + blobs))
+      temp_file.flush()
+      os.fsync(temp_file.fileno())
+    # Like loose objects, the file is only ever replaced, never edited.
+    os.chmod(temp_path, 0o444)
+    os.replace(temp_path, path)
+  except BaseException:
+    os.remove(temp_path)
+    raise
+
+def compute_changed_path_filter(repo, git_commit):
+  parents = commit_parents(git_commit)
+  parent_tree = commit_tree(read_object(repo, parents[0])) if len(parents) > 0 else None
+  paths = []
+  for path in diff_tree_paths(repo, parent_tree, commit_tree(git_commit)):
+    paths.append(path)
+    if len(paths) > BloomFilter.MAX_CHANGED_PATHS:
+      return BloomFilter.from_paths(None)
+  return BloomFilter.from_paths(paths)
+
+def update_changed_path_filters(repo, tips):
+  """
+  Computes filters for reachable commits that do not have one yet.
+  Returns the number of filters computed.
+  """
+  existing = read_changed_path_filters(repo)
+  filters = {}
+  for sha in iter_commits(repo, tips):
+    if sha not in existing:
+      filters[sha] = compute_changed_path_filter(repo, read_object(repo, sha))
+  computed = len(filters)
+  if computed > 0:
+    filters.update(existing.items())
+    write_changed_path_filters(repo, filters)
+  return computed
+
+def normalize_path(path):
+  return path.strip(b"/")
+
+def path_limited_log(repo, sha, paths, filters=None):
+  """
+  Yields, newest first, the commits reachable from sha that changed any of paths.
+
+  A commit identical to one of its parents at paths is skipped and only
+  that parent is followed, like git's default history simplification.
+  The changed-path filter of a commit rules out its first parent without reading trees.
+  """
+  if filters is None:
+    filters = {}
+  paths = [normalize_path(path) for path in paths]
+
+  def changed(old_tree_sha, new_tree_sha):
+    return any(path_changed(repo, old_tree_sha, new_tree_sha, path) for path in paths)
+
+  git_commit = read_object(repo, sha)
+  heap = [(-commit_timestamp(git_commit), sha)]
+  seen = {sha}
+  while len(heap) > 0:
+    _, sha = heapq.heappop(heap)
+    git_commit = read_object(repo, sha)
+    tree_sha = commit_tree(git_commit)
+    parents = commit_parents(git_commit)
+
+    treesame_parent = None
+    for index, parent in enumerate(parents):
+      bloom_filter = filters.get(sha) if index == 0 else None
+      if bloom_filter is not None and not any(path == b"" or bloom_filter.maybe_contains(path) for path in paths):
+        treesame_parent = parent
+        break
+      if not changed(commit_tree(read_object(repo, parent)), tree_sha):
+        treesame_parent = parent
+        break
+
+    if treesame_parent is not None:
+      parents = [treesame_parent]
+    elif len(parents) > 0 or changed(None, tree_sha):
+      yield sha
+
+    for parent in parents:
+      if parent not in seen:
+        seen.add(parent)
+        heapq.heappush(heap, (-commit_timestamp(read_object(repo, parent)), parent))
+
+LOOSE_OBJECT_NAME = re.compile(r"^[0-9a-f]{38}$")
+PACK_INDEX_SIGNATURE = b"\xfftOc"
+
+def disk_usage(path):
+  stat = os.lstat(path)
+  # Count allocated blocks like git does where the platform reports them.
+  blocks = getattr(stat, "st_blocks", None)
+  return blocks * 512 if blocks is not None else stat.st_size
+
+def read_pack_index_names(path):
+  """
+  Returns the sorted object ids of a version 1 or 2 pack index as one bytes string.
+  """
+  with open(path, "rb") as index_file:
+    raw_data = index_file.read()
+  if raw_data[:4] == PACK_INDEX_SIGNATURE:
+    fanout_start, stride, name_offset = 8, 20, 0
+  else:
+    fanout_start, stride, name_offset = 0, 24, 4
+  count = int.from_bytes(raw_data[fanout_start + 255 * 4:fanout_start + 256 * 4], "big")
+  entries_start = fanout_start + 256 * 4
+  if stride == 20:
+    return raw_data[entries_start:entries_start + count * 20]
+  return b"".join(raw_data[entries_start + index * stride + name_offset:entries_start + (index + 1) * stride]
+                  for index in range(count))
+
+def sorted_names_contain(names, key):
+  low, high = 0, len(names) // 20
+  while low < high:
+    middle = (low + high) // 2
+    name = names[middle * 20:(middle + 1) * 20]
+    if name == key:
+      return True
+    elif name < key:
+      low = middle + 1
+    else:
+      high = middle
+  return False
+
+def count_repository_objects(repo):
+  """
+  Returns an OrderedDict of loose and packed object statistics, with sizes in bytes.
+  """
+  counts = collections.OrderedDict([
+    ("count", 0),
+    ("size", 0),
+    ("in-pack", 0),
+    ("packs", 0),
+    ("size-pack", 0),
+    ("prune-packable", 0),
+    ("garbage", 0),
+    ("size-garbage", 0)
+  ])
+
+  pack_names = []
+  pack_directory = repo.repo_dir("objects", "pack")
+  if pack_directory is not None:
+    files = set(os.listdir(pack_directory))
+    for file in sorted(files):
+      path = os.path.join(pack_directory, file)
+      base, extension = os.path.splitext(file)
+      if extension == ".pack" and base + ".idx" in files:
+        with open(path, "rb") as pack_file:
+          # "PACK", version, then the object count.
+          header = pack_file.read(12)
+        counts["packs"] += 1
+        counts["in-pack"] += int.from_bytes(header[8:12], "big")
+        # Packs are reported by their apparent size rather than their allocated blocks.
+        counts["size-pack"] += os.path.getsize(path) + os.path.getsize(os.path.join(pack_directory, base + ".idx"))
+        pack_names.append(read_pack_index_names(os.path.join(pack_directory, base + ".idx")))
+      elif extension == ".idx" and base + ".pack" in files:
+        continue
+      elif extension in (".keep", ".promisor", ".rev", ".bitmap", ".mtimes") and base + ".pack" in files:
+        continue
+      else:
+        counts["garbage"] += 1
+        counts["size-garbage"] += disk_usage(path)
+
+  objects_directory = repo.repo_dir("objects")
+  for prefix in sorted(os.listdir(objects_directory)):
+    if re.match(r"^[0-9a-f]{2}$", prefix) is None:
+      continue
+    prefix_directory = os.path.join(objects_directory, prefix)
+    for file in os.listdir(prefix_directory):
+      path = os.path.join(prefix_directory, file)
+      if LOOSE_OBJECT_NAME.match(file) is None:
+        counts["garbage"] += 1
+        counts["size-garbage"] += disk_usage(path)
+        continue
+      counts["count"] += 1
+      counts["size"] += disk_usage(path)
+      key = bytes.fromhex(prefix + file)
+      if any(sorted_names_contain(names, key) for names in pack_names):
+        counts["prune-packable"] += 1
+
+  return counts
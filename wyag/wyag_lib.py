@@ -11,13 +11,30 @@ from wyag.objects.git_object import GIT_OBJECT_TYPES
 from wyag.utils.logger import Logger
 from wyag.utils.objects_utils import find_repo, find_object, read_object, \
   generate_object_hash, InvalidObjectType, generate_graphviz_log, checkout_tree, \
-  list_reference, print_reference, create_tag
+  list_reference, print_reference, create_tag, split_revision_and_paths, grep_tree, BINARY_MATCH, \
+  read_changed_path_filters, path_limited_log, reference_tips, update_changed_path_filters, \
+  iter_reachable_objects, count_repository_objects, ReferenceError
 
 class Context(object):
   def __init__(self, verbose):
     self.verbose = verbose
     self.logger = Logger(self.verbose)
 
+class SeparatorCommand(click.Command):
+  """
+  Records in the click context how many arguments followed "--", which the parser drops.
+  """
+  def parse_args(self, context, args):
+    context.meta["separated_count"] = len(args) - args.index("--") - 1 if "--" in args else None
+    return super().parse_args(context, args)
+
+def revision_after_separator(paths):
+  """
+  Returns whether "--" came right before the revision argument, making it the first path.
+  """
+  separated_count = click.get_current_context().meta.get("separated_count")
+  return separated_count == len(paths) + 1
+
 class AliasedGroup(click.Group):
     """
     This subclass of a group supports looking up aliases in a config
@@ -36,7 +53,10 @@ class AliasedGroup(click.Group):
         "hash_object": "hash-object",
         "ls_tree": "ls-tree",
         "co": "checkout",
-        "show_ref": "show-ref"
+        "show_ref": "show-ref",
+        "commit_graph": "commit-graph",
+        "rev_list": "rev-list",
+        "count_objects": "count-objects"
       }
       aliased_command = alias.get(command_name, None)
       if aliased_command is not None:
@@ -97,18 +117,57 @@ def hash_object(context, object_type, write, file):
   except InvalidObjectType as e:
     context.logger.error(str(e))
 
-@cli.command()
-@click.argument("commit", type=click.STRING, default="HEAD")
+@cli.command(cls=SeparatorCommand)
+@click.argument("commit", type=click.STRING, required=False, default=None)
+@click.argument("paths", nargs=-1, type=click.STRING)
 @click.pass_obj
-def log(context, commit):
+def log(context, commit, paths):
   """
   Display history of a given commit.
+
+  Without paths, prints the commit graph as a graphviz digraph. With paths,
+  prints the sha of each commit that changed them, one per line, newest first.
+
+  commit: The commit to start from. Defaults to HEAD.
+  paths: Limit the history to commits that changed these paths.
   """
   repo = find_repo(os.getcwd(), context.logger)
+  try:
+    commit, paths = split_revision_and_paths(repo, commit, paths,
+                                            explicit_paths=revision_after_separator(paths))
+    sha = find_object(repo, commit, object_type="commit")
+  except ReferenceError as e:
+    context.logger.error(str(e))
+    return
+  if sha is None:
+    context.logger.error("Not a commit: {}".format(commit))
+    return
+
+  if len(paths) > 0:
+    filters = read_changed_path_filters(repo)
+    paths = [path.encode() for path in paths]
+    for commit_sha in path_limited_log(repo, sha, paths, filters=filters):
+      context.logger.echo(commit_sha)
+    return
+
   context.logger.echo("digraph wyaglog{")
-  generate_graphviz_log(repo, find_object(repo, commit), context.logger)
+  generate_graphviz_log(repo, sha, context.logger)
   context.logger.echo("}")
 
+@cli.command()
+@click.argument("action", type=click.Choice(["write"]))
+@click.pass_obj
+def commit_graph(context, action):
+  """
+  Write changed-path Bloom filters for commits reachable from HEAD and all references.
+
+  Filters are stored in objects/info/changed-paths and let log -- <path> skip
+  commits without reading their trees.
+  """
+  repo = find_repo(os.getcwd(), context.logger)
+  computed = update_changed_path_filters(repo, reference_tips(repo))
+  context.logger.info("computed {} changed-path filters".format(computed))
+
 @cli.command()
 @click.argument("git_object", type=click.STRING)
 @click.pass_obj
@@ -128,6 +187,57 @@ def ls_tree(context, git_object):
                                                                     sha=node.sha,
                                                                     path=node.path.decode("ascii")))
 
+@cli.command(cls=SeparatorCommand)
+@click.option("--ignore-case", "-i", is_flag=True, default=False, flag_value=True, help="Ignore case differences between the pattern and the files.")
+@click.option("--line-number", "-n", is_flag=True, default=False, flag_value=True, help="Prefix the line number to matching lines.")
+@click.option("--files-with-matches", "-l", is_flag=True, default=False, flag_value=True, help="Show only the names of files that match.")
+@click.option("--text", "-a", is_flag=True, default=False, flag_value=True, help="Process binary files as if they were text.")
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=None, help="Number of worker threads scanning blobs.")
+@click.argument("pattern", type=click.STRING)
+@click.argument("commit", type=click.STRING, required=False, default=None)
+@click.argument("pathspecs", nargs=-1, type=click.STRING)
+@click.pass_obj
+def grep(context, ignore_case, line_number, files_with_matches, text, jobs, pattern, commit, pathspecs):
+  """
+  Print lines matching a pattern in a commit's tree.
+
+  Binary files are reported as "Binary file <path> matches" unless --text is given.
+
+  pattern: The regular expression to search for.
+  commit: The commit or tree to search. Defaults to HEAD.
+  pathspecs: Limit the search to these paths, relative to the worktree root.
+  """
+  repo = find_repo(os.getcwd(), context.logger)
+  try:
+    commit, pathspecs = split_revision_and_paths(repo, commit, pathspecs,
+                                                 explicit_paths=revision_after_separator(pathspecs))
+    tree_sha = find_object(repo, commit, object_type="tree")
+  except ReferenceError as e:
+    context.logger.error(str(e))
+    return
+
+  flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+  try:
+    regex = re.compile(pattern.encode(), flags)
+  except re.error as e:
+    context.logger.error("Invalid pattern {}: {}".format(pattern, e))
+    return
+
+  pathspecs = tuple(pathspec.encode() for pathspec in pathspecs)
+  for path, matches in grep_tree(repo, tree_sha, regex, pathspecs=pathspecs, text=text, jobs=jobs):
+    prefix = "{}:{}".format(commit, path.decode("utf-8", errors="replace"))
+    if files_with_matches:
+      context.logger.echo(prefix)
+      continue
+    if matches is BINARY_MATCH:
+      context.logger.echo("Binary file {} matches".format(prefix))
+      continue
+    for number, line in matches:
+      number_part = "{}:".format(number) if line_number else ""
+      context.logger.echo("{prefix}:{number}{line}".format(prefix=prefix,
+                                                           number=number_part,
+                                                           line=line.decode("utf-8", errors="replace")))
+
 @cli.command()
 @click.argument("commit_sha", type=click.STRING)
 @click.argument("path", type=click.Path(file_okay=False))
@@ -194,4 +304,41 @@ def tag(context, name, object_sha, annotate):
     references_dict = list_reference(repo)
     print_reference(repo, references_dict.get("tag", {}), context.logger, with_hash=False)
 
+@cli.command()
+@click.option("--objects", is_flag=True, default=False, flag_value=True, help="Also list the trees and blobs referenced by the commits.")
+@click.argument("commits", nargs=-1, type=click.STRING)
+@click.pass_obj
+def rev_list(context, objects, commits):
+  """
+  List objects reachable from commits.
+
+  commits: The objects to start from. Defaults to HEAD and all references.
+  """
+  repo = find_repo(os.getcwd(), context.logger)
+  if len(commits) > 0:
+    tips = [find_object(repo, commit) for commit in commits]
+  else:
+    tips = reference_tips(repo)
+
+  for sha, object_type, path in iter_reachable_objects(repo, tips, objects=objects):
+    if path is None or path == b"":
+      context.logger.echo(sha)
+    else:
+      context.logger.echo("{} {}".format(sha, path.decode("utf-8", errors="replace")))
+
+@cli.command()
+@click.option("--verbose", "-v", is_flag=True, default=False, flag_value=True, help="Report packed objects and garbage as well.")
+@click.pass_obj
+def count_objects(context, verbose):
+  """
+  Count loose objects and their disk consumption.
+  """
+  repo = find_repo(os.getcwd(), context.logger)
+  counts = count_repository_objects(repo)
+  kibibytes = {key: value // 1024 for key, value in counts.items() if key.startswith("size")}
 
+  if not verbose:
+    context.logger.echo("{} objects, {} kilobytes".format(counts["count"], kibibytes["size"]))
+    return
+  for key, value in counts.items():
+    context.logger.echo("{}: {}".format(key, kibibytes.get(key, value)))